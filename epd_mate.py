@@ -17,9 +17,13 @@ Requirements:
 - Stockfish binary for Windows (point Engine Path to it)
 
 Notes on performance and reliability:
-- The app counts lines first (fast sequential pass) then performs analysis in a second pass.
-- Uses a single engine instance for simplicity and to avoid process explosion; you can set threads in engine options.
-- For heavy throughput, consider adding worker processes each with their own engine instance.
+- Analysis reads the input in a single pass; progress and ETA are measured in bytes read,
+  using the line count from file selection for the position counter.
+- Positions are analysed by a pool of engine workers (one engine process each); the thread
+  budget from the UI is split between them, and kept lines are still written in input order.
+- Finished games (checkmate/stalemate) and dead positions (insufficient material) are skipped,
+  and every position gets a shallow probe first; only a mate or a decisive evaluation
+  escalates to the full-depth search.
 - Always closes engine and subprocesses to avoid memory leaks.
 
 """
@@ -28,28 +32,37 @@ import sys
 import os
 import time
 import threading
+import queue
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import timedelta
 import json
+import copy
 import re
 import signal
+import mmap
+import logging
+import atexit
 
 # Qt bindings compatibility: prefer PySide6, fallback to PyQt6, PySide2 or PyQt5
 try:
     from PySide6.QtWidgets import (
         QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
         QPushButton, QLabel, QProgressBar, QFileDialog, QSpinBox, QSlider,
-        QLineEdit, QTextEdit, QMessageBox, QCheckBox, QComboBox, QDialog
+        QLineEdit, QPlainTextEdit, QMessageBox, QCheckBox, QComboBox, QDialog
     )
     from PySide6.QtCore import Qt, QTimer, Slot, QEvent
+    from PySide6.QtGui import QTextCursor
     QT_BINDING = 'PySide6'
 except Exception:
     try:
         from PyQt6.QtWidgets import (
         QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
         QPushButton, QLabel, QProgressBar, QFileDialog, QSpinBox, QSlider,
-        QLineEdit, QTextEdit, QMessageBox, QCheckBox, QComboBox, QDialog
+        QLineEdit, QPlainTextEdit, QMessageBox, QCheckBox, QComboBox, QDialog
         )
         from PyQt6.QtCore import Qt, QTimer, QEvent
+        from PyQt6.QtGui import QTextCursor
         # PyQt6 uses different slot decorator name
         from PyQt6.QtCore import pyqtSlot as Slot
         QT_BINDING = 'PyQt6'
@@ -58,18 +71,20 @@ except Exception:
             from PySide2.QtWidgets import (
                 QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                 QPushButton, QLabel, QProgressBar, QFileDialog, QSpinBox, QSlider,
-                QLineEdit, QTextEdit, QMessageBox, QCheckBox, QComboBox, QDialog
+                QLineEdit, QPlainTextEdit, QMessageBox, QCheckBox, QComboBox, QDialog
             )
             from PySide2.QtCore import Qt, QTimer, Slot, QEvent
+            from PySide2.QtGui import QTextCursor
             QT_BINDING = 'PySide2'
         except Exception:
             try:
                 from PyQt5.QtWidgets import (
                 QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                 QPushButton, QLabel, QProgressBar, QFileDialog, QSpinBox, QSlider,
-                QLineEdit, QTextEdit, QMessageBox, QCheckBox, QComboBox, QDialog
+                QLineEdit, QPlainTextEdit, QMessageBox, QCheckBox, QComboBox, QDialog
                 )
                 from PyQt5.QtCore import Qt, QTimer, QEvent
+                from PyQt5.QtGui import QTextCursor
                 from PyQt5.QtCore import pyqtSlot as Slot
                 QT_BINDING = 'PyQt5'
             except Exception:
@@ -77,314 +92,898 @@ except Exception:
 
 import chess
 import chess.engine
+import chess.polyglot
+
+# Optional C JSON encoder for the puzzle export; the stdlib encoder is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional vectorised newline counting in count_lines(); bytes.count() is the fallback
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# chess.engine logs every UCI line it exchanges at debug level; raise the
+# threshold so those calls return early instead of going through logging.
+logging.getLogger('chess.engine').setLevel(logging.ERROR)
+
+# Custom event type for _CallableEvent, registered once; Qt only has a limited
+# range of user event ids, so registering one per event would exhaust it.
+_CALLABLE_EVENT_TYPE = QEvent.Type(QEvent.registerEventType())
 
 # Small event wrapper to post callables from background threads to the Qt main thread
+# (kept over signals; see design_notes.md)
 class _CallableEvent(QEvent):
-    def __init__(self, callable_):
-        super().__init__(QEvent.Type(QEvent.registerEventType()))
+    # Posted with a bound method and its arguments, so no closure is built per event
+    def __init__(self, callable_, *args):
+        super().__init__(_CALLABLE_EVENT_TYPE)
         self.callable = callable_
+        self.args = args
+
+
+class _PendingUpdates:
+    """Coalesce log lines from worker threads into one posted event at a time.
+
+    log() queues text; the first line after a drain posts a _CallableEvent
+    to receiver, which calls apply(log_lines) on the GUI thread. Lines
+    logged from the GUI thread itself are applied at once, together with
+    anything still queued, so they keep their order without a round trip
+    through the event queue. Progress is not routed here: the windows poll
+    the worker's attributes instead.
+    """
+
+    def __init__(self, receiver, apply, max_log_lines=None):
+        self._receiver = receiver
+        self._apply = apply
+        # Created by the window, so this is the GUI thread
+        self._gui_thread = threading.get_ident()
+        # The application outlives every window; looked up once instead of per post
+        self._app = QApplication.instance()
+        self._lock = threading.Lock()
+        self._log = deque(maxlen=max_log_lines or PENDING_LOG_LINES)
+        self._scheduled = False
+
+    def log(self, text):
+        direct = threading.get_ident() == self._gui_thread
+        with self._lock:
+            self._log.append(text)
+            if not direct:
+                self._schedule()
+        if direct:
+            self._drain()
+
+    def _schedule(self):
+        # Called with the lock held
+        if not self._scheduled:
+            self._scheduled = True
+            self._app.postEvent(self._receiver, _CallableEvent(self._drain))
+
+    def _drain(self):
+        with self._lock:
+            log_lines = list(self._log)
+            self._log.clear()
+            self._scheduled = False
+        if log_lines:
+            # Empty when a direct drain already took the lines of a posted event
+            self._apply(log_lines)
+
+
+def _append_log_lines(text_edit, log_lines):
+    """Append log_lines to a read-only log view in one insert and scroll to the end."""
+    cursor = text_edit.textCursor()
+    cursor.movePosition(QTextCursor.MoveOperation.End)
+    text = '\n'.join(log_lines)
+    cursor.insertText('\n' + text if not text_edit.document().isEmpty() else text)
+    text_edit.setTextCursor(cursor)
+    text_edit.verticalScrollBar().setValue(text_edit.verticalScrollBar().maximum())
 
 # --- Debug logging setup ---
 DEBUG_LOG = "debug.log"
+# Write buffer of the debug log; the file stays open for the whole session
+DEBUG_LOG_BUFFER_SIZE = 1 << 16
+
+# Opened once (truncating the previous log); None if the file cannot be written
+try:
+    _debug_fh = open(DEBUG_LOG, "w", encoding="utf-8", buffering=DEBUG_LOG_BUFFER_SIZE)
+    atexit.register(_debug_fh.close)
+except Exception:
+    _debug_fh = None
+
+# Called from the GUI, the analyser and the export threads; TextIOWrapper
+# itself is not safe for concurrent writes
+_debug_lock = threading.Lock()
 
 def debug_log(msg):
     """Write message to debug log (and console)"""
     timestamp = time.strftime("%H:%M:%S")
     line = f"[{timestamp}] {msg}"
     print(line)
-    try:
-        with open(DEBUG_LOG, "a", encoding="utf-8") as f:
-            f.write(line + "\n")
-    except Exception:
-        pass
+    if _debug_fh is not None:
+        try:
+            with _debug_lock:
+                _debug_fh.write(line + "\n")
+        except Exception:
+            pass
 
-# Clear the previous log at startup
-open(DEBUG_LOG, "w").close()
 debug_log("=== New Run Started ===")
 
 
 # Engine default settings for search depth and threads
 DEFAULT_DEPTH = 20
 DEFAULT_THREADS = 1
+# Transposition table size (MB), shared between all engine workers
+DEFAULT_HASH_MB = 256
+MIN_HASH_MB = 16
+MAX_HASH_MB = 16384
+# Wall-clock cap per deep search in seconds (0 = bounded by depth only)
+DEFAULT_TIME_CAP = 0
+MAX_TIME_CAP = 600
+# Engine worker pool size (each worker runs its own engine process); independent
+# single-threaded searches scale better than one engine with many threads
+MAX_WORKERS = 16
+try:
+    # CPUs this process may actually run on (affinity masks, container limits)
+    _AVAILABLE_CPUS = len(os.sched_getaffinity(0))
+except (AttributeError, OSError):
+    _AVAILABLE_CPUS = os.cpu_count() or 1
+DEFAULT_WORKERS = max(1, min(_AVAILABLE_CPUS, MAX_WORKERS))
+# Shallow probe run before the full-depth search; positions without a mate
+# or a decisive evaluation (either side) at this depth are not searched deeper.
+PROBE_DEPTH = 6
+PROBE_MARGIN_CP = 300
+# Output writes: JSON entries per bulk write and the file buffer size (EPD and JSON)
+OUTPUT_BATCH = 1024
+OUTPUT_BUFFER_SIZE = 1 << 20
+# Bytes of kept EPD lines collected before a chunk goes to the writer thread
+OUTPUT_CHUNK_SIZE = 1 << 16
+# Seconds between pushing buffered kept lines to disk, so slow runs still show output
+OUTPUT_FLUSH_INTERVAL = 5.0
+# Parsed positions buffered between the reader thread and the dispatcher
+PARSE_QUEUE_SIZE = 256
+# Chunks of kept lines buffered between the dispatcher and the writer thread
+WRITE_QUEUE_SIZE = 8
+# Most positions remembered for duplicate detection (least recently seen go first)
+SEEN_CACHE_SIZE = 1_000_000
+# Minimum seconds between progress/ETA updates and between batched log posts
+UI_UPDATE_INTERVAL = 0.1
+LOG_FLUSH_INTERVAL = 0.5
+# Batched log lines that force a post before the interval is up
+LOG_BATCH_LINES = 64
+# Log messages held for the GUI between two repaints (oldest are dropped beyond this)
+PENDING_LOG_LINES = 1000
+# Lines kept in a log view; the oldest are discarded beyond this
+LOG_MAX_BLOCKS = 5000
+# Milliseconds between GUI polls of a running worker's progress
+UI_POLL_INTERVAL_MS = 100
+# Block size for reading the input EPD
+READ_CHUNK_SIZE = 1 << 20
+# Slice size used when counting newlines over a memory-mapped file
+COUNT_SLICE_SIZE = 16 * 1024 * 1024
 SETTINGS_FILE = 'epd_mate_settings.json'
+# Input files whose line counts are remembered in the settings file
+POSITION_COUNT_CACHE_SIZE = 32
 
 
-def _read_settings_data():
+# Settings as last read from or written to SETTINGS_FILE; the file is parsed
+# once per session and every update goes through update_settings()
+_settings_cache = None
+_settings_lock = threading.Lock()
+
+
+def _load_settings_file():
+    # A missing file is just another failed open, no separate existence check
     try:
-        if os.path.exists(SETTINGS_FILE):
-            with open(SETTINGS_FILE, 'r', encoding='utf-8') as sf:
-                return json.load(sf)
+        with open(SETTINGS_FILE, 'r', encoding='utf-8') as sf:
+            return json.load(sf)
     except Exception:
         pass
     return {}
 
 
+def _read_settings_data():
+    global _settings_cache
+    with _settings_lock:
+        if _settings_cache is None:
+            _settings_cache = _load_settings_file()
+        # Callers may modify what they get back
+        return copy.deepcopy(_settings_cache)
+
+
 def _write_settings_data(data):
+    # Write a sibling file and swap it in, so a crash never leaves half a file
+    tmp_path = SETTINGS_FILE + '.tmp'
     try:
-        with open(SETTINGS_FILE, 'w', encoding='utf-8') as sf:
+        with open(tmp_path, 'w', encoding='utf-8') as sf:
             json.dump(data, sf, indent=2)
+        os.replace(tmp_path, SETTINGS_FILE)
     except Exception:
-        pass
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
 
 
 def update_settings(updates):
-    data = _read_settings_data()
-    try:
-        data.update(updates or {})
-    except Exception:
-        # fallback to rewriting updates only if data isn't a dict
-        data = updates or {}
-    _write_settings_data(data)
+    global _settings_cache
+    with _settings_lock:
+        data = _settings_cache if _settings_cache is not None else _load_settings_file()
+        try:
+            new_data = {**data, **copy.deepcopy(updates or {})}
+        except Exception:
+            # fallback to rewriting updates only if data isn't a dict
+            new_data = copy.deepcopy(updates or {})
+        if new_data == data:
+            # Nothing changed; leave the file alone
+            _settings_cache = data
+            return
+        _write_settings_data(new_data)
+        _settings_cache = new_data
+
+
+def _advise_sequential(mm):
+    """Tell the kernel a mapping is read front to back (larger read-ahead).
+
+    posix_fadvise() covers read() calls; page faults on a mapping follow
+    madvise() instead. A no-op where the platform has no madvise.
+    """
+    if hasattr(mmap, 'MADV_SEQUENTIAL'):
+        try:
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
+def count_lines(path):
+    """Count the lines of a file, including a final line without newline.
+
+    The file is memory-mapped and scanned over large slices, with numpy
+    when it is installed and bytes.count() otherwise, so the count runs in
+    C at memory bandwidth.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            # mmap refuses empty files
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            _advise_sequential(mm)
+            count = 0
+            if numpy is not None:
+                # SIMD compare over a zero-copy view of the mapping
+                view = numpy.frombuffer(mm, dtype=numpy.uint8)
+                try:
+                    for start in range(0, size, COUNT_SLICE_SIZE):
+                        count += int(numpy.count_nonzero(view[start:start + COUNT_SLICE_SIZE] == 0x0A))
+                finally:
+                    # The mapping cannot close while the view still exports it
+                    del view
+            else:
+                # Slicing an mmap copies, so copy one bounded slice at a time
+                for start in range(0, size, COUNT_SLICE_SIZE):
+                    count += mm[start:start + COUNT_SLICE_SIZE].count(b'\n')
+            if mm[size - 1] != 0x0A:
+                count += 1
+    return count
+
+
+def _iter_lines(f, chunk_size=READ_CHUNK_SIZE):
+    """Yield the lines of binary file f without their trailing newline.
 
-# Analyzer thread to analyze positions sequentially.
+    The file is memory-mapped and cut into blocks of about chunk_size that
+    end on a newline, so each block is copied out of the page cache once
+    and split in one call.
+    """
+    size = os.fstat(f.fileno()).st_size
+    if size == 0:
+        # mmap refuses empty files
+        return
+    will_need = getattr(mmap, 'MADV_WILLNEED', None)
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        _advise_sequential(mm)
+        start = 0
+        while start < size:
+            end = mm.rfind(b'\n', start, start + chunk_size)
+            if end < 0:
+                # No newline in this block: the line runs on past it (or to EOF)
+                end = mm.find(b'\n', start + chunk_size)
+                if end < 0:
+                    end = size
+            if will_need is not None and end + 1 < size:
+                # Have the kernel fetch the next block asynchronously while this
+                # one is split and consumed (madvise wants a page-aligned start)
+                ahead = (end + 1) - (end + 1) % mmap.PAGESIZE
+                try:
+                    mm.madvise(will_need, ahead, min(chunk_size, size - ahead))
+                except OSError:
+                    will_need = None
+            yield from mm[start:end].split(b'\n')
+            start = end + 1
+
+
+def _spawn_engine(engine_path, threads, hash_mb=None):
+    """Start one UCI engine process and apply thread/hash options if supported.
+
+    The engine process is kept for the whole run, so its hash table carries
+    over between positions (no game argument is passed, so python-chess
+    sends ucinewgame only once). Ponder and UCI_AnalyseMode are managed by
+    python-chess for analysis and need no configuration here.
+    """
+    engine = chess.engine.SimpleEngine.popen_uci(engine_path)
+    options = {'Threads': max(1, int(threads))}
+    if hash_mb:
+        options['Hash'] = max(1, int(hash_mb))
+    for name, value in options.items():
+        # Some engines might reject unknown options
+        if name in engine.options:
+            try:
+                engine.configure({name: value})
+            except Exception:
+                pass
+    return engine
+
+
+def _engine_mate(score):
+    """Extract the signed mate distance from an engine score, or None.
+
+    Engine scores are PovScores; the analysed side is the side to move.
+    """
+    return score.relative.mate() if score is not None else None
+
+
+# Cheap shape check for FEN strings (piece placement, side, castling, en
+# passant, optional clocks), matched at the start of an EPD line; chess.Board()
+# still does the full validation. Group 1 takes the FEN fields after any
+# leading blanks and stops before the operands. Fewer than two clocks only
+# match when no further number follows, so a malformed counter such as "4;"
+# cannot be split off as an operand.
+_FEN_PATTERN = re.compile(
+    r'\s*([pnbrqkPNBRQK1-8]+(?:/[pnbrqkPNBRQK1-8]+){7}\s+[wb]\s+(?:-|[KQkqA-Ha-h]+)\s+(?:-|[a-h][1-8])'
+    r'(?:\s+\d+\s+\d+|\s+\d+(?!\s+\d)|(?!\s+\d)))(?!\S)'
+)
+# The same check on raw input bytes for the analyser; a match is plain ASCII
+_FEN_BYTES_PATTERN = re.compile(_FEN_PATTERN.pattern.encode('ascii'))
+
+# Marker for positions not analysed yet
+_UNSEEN = object()
+
+# Highest mate distance selectable in the UI
+MAX_MATE_LIMIT = 12
+# Largest mate limit the optional tactical prefilter is applied to
+PREFILTER_MAX_MATE = 3
+# The prefilter only skips positions with more legal moves than this (typical
+# quiet middlegame positions); tighter positions always go to the engine
+PREFILTER_MIN_MOVES = 40
+# Pre-built theme operands (output bytes), indexed by mate distance
+_MATE_SUFFIX = [None] + [f' ; theme "mate {i}";'.encode('ascii') for i in range(1, MAX_MATE_LIMIT + 1)]
+# Line ending of the filtered EPD; the output is binary, so match what text mode wrote
+_OUTPUT_NEWLINE = os.linesep.encode('ascii')
+
+
+class _LogBatcher:
+    """Collect log lines and pass them to callback as one joined message.
+
+    Used from a single thread; the owner calls flush() periodically and
+    when it is done.
+    """
+
+    def __init__(self, callback, max_lines=LOG_BATCH_LINES):
+        self._callback = callback
+        self._max_lines = max_lines
+        self._lines = []
+
+    def __call__(self, msg):
+        self._lines.append(msg)
+        if len(self._lines) >= self._max_lines:
+            self.flush()
+
+    def flush(self):
+        if self._lines:
+            text = '\n'.join(self._lines)
+            self._lines.clear()
+            self._callback(text)
+
+
+# Analyzer thread to analyze positions with a pool of engine processes.
 class AnalyzerThread(threading.Thread):
-    """Background worker to analyze positions sequentially."""
-    def __init__(self, input_path, output_path, engine_path, depth, threads, mate_limit, add_solution, progress_callback, eta_callback, log_callback, stop_event):
+    """Background worker that dispatches positions to a pool of engines.
+
+    Every worker owns its own engine process, so positions are searched in
+    parallel while results are still consumed (and written) in input order.
+    Progress is published in the progress and eta attributes for polling;
+    progress_callback and eta_callback are optional (None) extras.
+    """
+    def __init__(self, input_path, output_path, engine_path, depth, threads, mate_limit, add_solution, progress_callback, eta_callback, log_callback, stop_event, workers=DEFAULT_WORKERS, total_positions=None, hash_mb=DEFAULT_HASH_MB, time_cap=DEFAULT_TIME_CAP, tactical_prefilter=False):
         super().__init__()
         self.input_path = input_path
         self.output_path = output_path
         self.engine_path = engine_path
         self.depth = depth
         self.threads = threads
+        self.hash_mb = hash_mb
+        self.workers = max(1, min(MAX_WORKERS, int(workers)))
         self.mate_limit = mate_limit
+        self.time_cap = time_cap
+        # Skip wide-open quiet positions before any engine search (opt-in)
+        self.tactical_prefilter = bool(tactical_prefilter) and 1 <= mate_limit <= PREFILTER_MAX_MATE
         # whether to add mate solution to output (UI checkbox)
         self.add_solution = bool(add_solution)
+        # Info the deep search asks for: the PV is only read for the solution operand
+        self._deep_info = chess.engine.INFO_SCORE | (chess.engine.INFO_PV if self.add_solution else chess.engine.INFO_NONE)
         self.progress_callback = progress_callback
         self.eta_callback = eta_callback
         self.log_callback = log_callback
+        # Per-line messages (kept lines, invalid FENs) go out in batches
+        self._log_batch = _LogBatcher(log_callback)
         self.stop_event = stop_event
         # Keep initialization lightweight; heavy work runs in run().
-        self._engine = None
-        self._total_positions = 0
-        self._processed = 0
-        self._kept = 0
-
-    def run(self):
+        self._engines = []
+        self._engine_pool = queue.Queue()
+        # 64-bit Zobrist hash -> pending future, analysis info of a kept
+        # position, or None for a position that was not kept (LRU bounded).
+        # An int key is a tenth of the size of Board._transposition_key(),
+        # which matters at SEEN_CACHE_SIZE entries.
+        self._seen = OrderedDict()
+        # Line count from the UI if already known; progress itself is byte based
+        self._total_positions = total_positions or 0
+        # Latest (percent, processed, total, kept) and seconds left; replaced as
+        # whole tuples/values, so a reader on another thread sees a consistent state
+        self.progress = (0, 0, self._total_positions, 0)
+        self.eta = None
+        # Positions the tactical prefilter skipped; written by the reader thread
+        self.prefiltered = 0
+
+    def _analyse(self, board, limit):
+        # Runs on a pool thread: borrow an idle engine for the duration of one search.
+        engine = self._engine_pool.get()
         try:
-            # Start engine
-            self.log_callback(f"Starting engine: {self.engine_path} (depth={self.depth}, threads={self.threads})")
-            engine = chess.engine.SimpleEngine.popen_uci(self.engine_path)
-            self._engine = engine
-            # apply options if available
-            try:
-                engine.configure({'Threads': max(1, int(self.threads))})
-            except Exception:
-                # Some engines might reject unknown options
-                pass
+            if self.depth > PROBE_DEPTH:
+                # Cheap probe first: quiet positions never pay for the deep search
+                info = engine.analyse(board, chess.engine.Limit(depth=PROBE_DEPTH), info=chess.engine.INFO_SCORE)
+                score = info.get('score')
+                if score is not None:
+                    # INFO_SCORE always yields a PovScore; a non-mate score has a cp value
+                    relative = score.relative
+                    if relative.mate() is None and abs(relative.score()) < PROBE_MARGIN_CP:
+                        return info
+            # Only the score (and the PV when writing solutions) is read, so the
+            # info mask keeps python-chess from parsing everything else. Stream
+            # the iterations and stop as soon as a mate within the limit shows up;
+            # searching the remaining plies cannot change the verdict. A cancel
+            # ends the search the same way: leaving the block sends "stop", so the
+            # engine returns within one info line instead of finishing the depth.
+            mate_limit = self.mate_limit
+            stop_is_set = self.stop_event.is_set
+            with engine.analysis(board, limit, info=self._deep_info) as analysis:
+                for info in analysis:
+                    if stop_is_set():
+                        break
+                    # Runs per info line (currmove lines carry no score), so the
+                    # _engine_mate() call is inlined
+                    score = info.get('score')
+                    if score is not None:
+                        mate = score.relative.mate()
+                        if mate is not None and 1 <= abs(mate) <= mate_limit:
+                            break
+                return dict(analysis.info)
+        finally:
+            self._engine_pool.put(engine)
+
+    def _write_result(self, write_buf, line, line_number, board, info):
+        """Apply the mate filter to one analysed position.
+
+        line is the raw input line (bytes) as queued by the reader; a kept
+        line is appended to the write_buf bytearray. Returns the mate
+        distance when the line was kept, otherwise None.
+        """
+        mate = _engine_mate(info.get('score'))
+        if mate is None:
+            return None
+        mate_moves = abs(mate)
+        # Keep if mate_moves within limit and positive
+        if not 1 <= mate_moves <= self.mate_limit:
+            return None
 
-            total_positions = 0
-            # First pass: count lines
-            with open(self.input_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for _ in f:
-                    total_positions += 1
-            if total_positions == 0:
-                self.log_callback('Input file is empty.')
+        # Append the pieces in place to the output chunk (a bytearray); the
+        # output is binary, so the input bytes are written untouched
+        write_buf += line.rstrip(b'\r\n')
+
+        # The PV is only needed for the solution operand
+        pv_raw = info.get('pv') if self.add_solution else None
+        if pv_raw:
+            move_ucis = []
+            mate_index = None
+            # Replay on the position itself and unwind afterwards (no board copy)
+            pushed = 0
+            for idx, mv in enumerate(pv_raw):
                 try:
-                    engine.quit()
+                    uci = mv.uci()
+                except Exception:
+                    uci = str(mv)
+                move_ucis.append(uci)
+                try:
+                    board.push(mv)
                 except Exception:
+                    break
+                pushed += 1
+                if board.is_checkmate():
+                    mate_index = idx
+                    break
+            for _ in range(pushed):
+                board.pop()
+
+            # Mark the mating move (or the last PV move if the mate was not reached)
+            mark_idx = mate_index if mate_index is not None else len(move_ucis) - 1
+            move_ucis[mark_idx] += '#'
+            moves_str = ' '.join(move_ucis)
+            # use 'sol' token to indicate solution moves (EPD operand quoted)
+            write_buf += b' ; sol "'
+            write_buf += moves_str.encode('ascii')
+            write_buf += b'";'
+            self._log_batch(f"Added solution moves ({len(move_ucis)}) for line {line_number}: {moves_str}")
+            # always append theme with mate distance so downstream tools can pick it up
+            if mate_moves < len(_MATE_SUFFIX):
+                write_buf += _MATE_SUFFIX[mate_moves]
+            else:
+                # Mate limits above the UI range are not pre-built
+                write_buf += f' ; theme "mate {mate_moves}";'.encode('ascii')
+        write_buf += _OUTPUT_NEWLINE
+        self._log_batch(f"Kept line {line_number}: mate in {mate_moves}")
+        return mate_moves
+
+    def _read_positions(self, out_queue, abort):
+        """Producer: read and parse input lines, then hand them to run().
+
+        Puts (line_number, raw_line, board, line_offset, end_offset, invalid)
+        per input line, where raw_line is the undecoded bytes and board is
+        None for lines that need no analysis, and a final None. Errors are
+        forwarded as the exception object.
+
+        Lines are checked at the bytes level and only the FEN is decoded;
+        kept lines are written out as the same bytes.
+        """
+        def put(item):
+            while not abort.is_set():
+                try:
+                    out_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
                     pass
+            return False
+
+        # Per-line lookups bound once for the loop below
+        stop_is_set = self.stop_event.is_set
+        fen_prefix = _FEN_BYTES_PATTERN.match
+        prefilter = self.tactical_prefilter
+        Board = chess.Board
+
+        try:
+            offset = 0
+            with open(self.input_path, 'rb', buffering=0) as fin:
+                for line_number, raw in enumerate(_iter_lines(fin), 1):
+                    if stop_is_set():
+                        break
+                    line_offset = offset
+                    # +1 for the newline stripped by _iter_lines
+                    offset += len(raw) + 1
+                    board = None
+                    invalid = False
+
+                    # One anchored match skips leading blanks, cuts the FEN off the
+                    # operands and validates its shape, without copying the line;
+                    # obviously malformed lines never reach chess.Board (which is
+                    # still needed for the duplicate key, filters and PV replay).
+                    fen_match = fen_prefix(raw)
+                    if fen_match:
+                        try:
+                            board = Board(fen_match.group(1).decode('ascii'))
+                        except Exception:
+                            # invalid fen, skip
+                            invalid = True
+
+                        if board is not None and (board.is_checkmate() or board.is_stalemate()
+                                                  or board.is_insufficient_material()):
+                            # Game already over, or neither side can ever mate:
+                            # there is no mate to find
+                            board = None
+
+                        if (board is not None and prefilter and not board.is_check()
+                                and board.legal_moves.count() > PREFILTER_MIN_MOVES
+                                and not any(map(board.gives_check, board.generate_legal_moves()))):
+                            # Wide-open quiet position without a single checking move:
+                            # assumed to hold no short mate, so it never reaches an engine
+                            board = None
+                            self.prefiltered += 1
+                    elif raw and not raw.isspace():
+                        # Blank lines are skipped silently; anything else is malformed
+                        invalid = True
+
+                    if not put((line_number, raw, board, line_offset, offset, invalid)):
+                        return
+            put(None)
+        except Exception as e:
+            put(e)
+
+    def _write_batches(self, fout, batches, errors):
+        """Writer: write (chunk, flush) items from run() to fout until a None.
+
+        The first write error is appended to errors; later batches are
+        still taken off the queue so run() never blocks on a full queue.
+        """
+        while True:
+            item = batches.get()
+            if item is None:
+                return
+            if errors:
+                continue
+            chunk, flush = item
+            try:
+                fout.write(chunk)
+                if flush:
+                    fout.flush()
+            except Exception as e:
+                errors.append(e)
+
+    def run(self):
+        executor = None
+        try:
+            # Start engines; split the thread and hash budgets between the workers
+            workers = self.workers
+            engine_threads = max(1, int(self.threads) // workers)
+            engine_hash = max(1, int(self.hash_mb) // workers) if self.hash_mb else None
+            self.log_callback(f"Starting {workers} engine worker(s): {self.engine_path} (depth={self.depth}, threads per engine={engine_threads}, hash per engine={engine_hash or 'default'} MB, time cap={f'{self.time_cap} s' if self.time_cap else 'off'})")
+            for _ in range(workers):
+                engine = _spawn_engine(self.engine_path, engine_threads, engine_hash)
+                self._engines.append(engine)
+                self._engine_pool.put(engine)
+
+            # Progress is measured in bytes read, so no counting pass is needed
+            file_size = os.path.getsize(self.input_path)
+            if file_size == 0:
+                self.log_callback('Input file is empty.')
                 return
 
-            self._total_positions = total_positions
-            self.log_callback(f"Total positions: {total_positions}")
+            total_positions = self._total_positions
+            if total_positions:
+                self.log_callback(f"Total positions: {total_positions}")
 
             # Prepare output file
             out_dir = os.path.dirname(self.output_path)
             if out_dir and not os.path.exists(out_dir):
                 os.makedirs(out_dir, exist_ok=True)
 
+            executor = ThreadPoolExecutor(max_workers=workers)
+            # Bounded reorder window: enough queued work to keep every engine busy
+            # while results are consumed strictly in input order (one shared
+            # stream, not byte-range shards; see design_notes.md).
+            window = workers * 4
+            pending = deque()
+            # Let the engine end the search itself once it proves a mate within the
+            # limit; the depth (and the time cap, if set) bounds positions without one.
+            limit = chess.engine.Limit(depth=self.depth, mate=self.mate_limit or None, time=self.time_cap or None)
+
             processed = 0
             kept = 0
-            start_time = time.time()
-            with open(self.input_path, 'r', encoding='utf-8', errors='ignore') as fin, open(self.output_path, 'w', encoding='utf-8') as fout:
-                for line in fin:
-                    if self.stop_event.is_set():
-                        self.log_callback('Analysis cancelled by user.')
-                        break
-
-                    fen_line = line.strip()
-                    processed += 1
-                    self._processed = processed
-
-                    # Update progress and ETA
-                    elapsed = time.time() - start_time
-                    avg = elapsed / processed
-                    remaining = total_positions - processed
-                    eta = remaining * avg
+            duplicates = 0
+            offset = 0
+            seen = self._seen
+            # Monotonic clock: elapsed time and ETA survive wall-clock adjustments
+            start_time = time.monotonic()
+
+            # Bind per-position lookups to locals once; the loops below run
+            # for every line of the input.
+            stop_is_set = self.stop_event.is_set
+            log_cb = self.log_callback
+            prog_cb = self.progress_callback
+            eta_cb = self.eta_callback
+            submit = executor.submit
+            analyse = self._analyse
+            write_result = self._write_result
+            zobrist_hash = chess.polyglot.zobrist_hash
+            monotonic = time.monotonic
+
+            last_ui_update = 0.0
+            last_log_flush = 0.0
+            last_output_flush = monotonic()
+            # Hot-path log lines (kept lines, invalid FENs) are posted to the UI in batches
+            log_batch = self._log_batch
+
+            def flush_log_batch():
+                nonlocal last_log_flush
+                last_log_flush = monotonic()
+                log_batch.flush()
+
+            def report_progress():
+                nonlocal last_ui_update, last_output_flush
+                # Throttle UI updates; the final update after the loop is unconditional
+                now = monotonic()
+                if now - last_log_flush >= LOG_FLUSH_INTERVAL:
+                    flush_log_batch()
+                if now - last_output_flush >= OUTPUT_FLUSH_INTERVAL:
+                    last_output_flush = now
+                    hand_off(flush=True)
+                if now - last_ui_update < UI_UPDATE_INTERVAL:
+                    return
+                last_ui_update = now
+                # Positions still in flight are not counted as processed yet
+                done = processed - len(pending)
+                done_offset = min(pending[0][4] if pending else offset, file_size)
+                elapsed = now - start_time
+                eta = elapsed * (file_size - done_offset) / done_offset if done_offset else 0.0
+                # Without a known line count, extrapolate it from the bytes consumed
+                total = total_positions or (done * file_size // done_offset if done_offset else 0)
+                self.progress = progress = (done_offset * 100 // file_size, done, total, kept)
+                self.eta = eta
+                if prog_cb is not None:
                     try:
-                        self.progress_callback(int(processed / total_positions * 100), processed, total_positions, kept)
+                        prog_cb(*progress)
                     except Exception:
                         pass
-
+                if eta_cb is not None:
                     try:
-                        self.eta_callback(eta)
+                        eta_cb(eta)
                     except Exception:
                         pass
 
-                    if not fen_line:
-                        continue
-
-                    fields = fen_line.split()
-                    if len(fields) >= 6:
-                        candidate_fen = ' '.join(fields[:6])
-                    else:
-                        candidate_fen = fen_line
-
-                    # Validate fen
-                    try:
-                        board = chess.Board(candidate_fen)
-                    except Exception:
-                        # invalid fen, skip
-                        self.log_callback(f"Skipping invalid FEN at line {processed}")
-                        continue
-
-                    # Analyse with engine
-                    try:
-                        limit = chess.engine.Limit(depth=self.depth)
-                        info = engine.analyse(board, limit)
-                        score = info.get('score')
-                        mate = None
-                        if score is not None:
-                            # 1) Try direct mate() (some Score types support it)
-                            try:
-                                mate = score.mate()
-                            except Exception:
-                                mate = None
-
-                            # 2) Try POV score if available
-                            if mate is None:
-                                try:
-                                    if hasattr(score, 'pov'):
-                                        try:
-                                            pov = score.pov(board.turn)
-                                        except Exception:
-                                            try:
-                                                pov = score.pov(chess.WHITE if board.turn else chess.BLACK)
-                                            except Exception:
-                                                pov = None
-                                        if pov is not None and hasattr(pov, 'mate'):
-                                            try:
-                                                mate = pov.mate()
-                                            except Exception:
-                                                mate = None
-                                except Exception:
-                                    mate = None
-
-                            # 3) Last resort: parse textual representation like "mate 3"
-                            if mate is None:
-                                try:
-                                    s = str(score)
-                                    m = re.search(r'mate\s*([+-]?\d+)', s)
-                                    if m:
-                                        mate = int(m.group(1))
-                                except Exception:
-                                    mate = None
-                        if mate is not None:
-                            mate_moves = abs(mate)
-                            # Keep if mate_moves within limit and positive
-                            if 1 <= mate_moves <= self.mate_limit:
-                                output_line = line.rstrip('\n')
-
-                                try:
-                                    pv_raw = info.get('pv') or []
-                                except Exception:
-                                    pv_raw = []
-
-                                pv_slice = []
-                                move_ucis = []
-                                mate_index = None
-
-                                if pv_raw:
-                                    board_cp = board.copy()
-                                    for idx, mv in enumerate(pv_raw):
-                                        pv_slice.append(mv)
-                                        try:
-                                            uci = mv.uci()
-                                        except Exception:
-                                            uci = str(mv)
-                                        move_ucis.append(uci)
-                                        try:
-                                            board_cp.push(mv)
-                                        except Exception:
-                                            break
-                                        if board_cp.is_checkmate():
-                                            mate_index = idx
-                                            break
-
-                                annotated_move_ucis = move_ucis.copy()
-                                if annotated_move_ucis:
-                                    mark_idx = mate_index if mate_index is not None else len(annotated_move_ucis) - 1
-                                    try:
-                                        annotated_move_ucis[mark_idx] = annotated_move_ucis[mark_idx] + '#'
-                                    except Exception:
-                                        pass
-
-                                if self.add_solution and annotated_move_ucis:
-                                    moves_str = ' '.join(annotated_move_ucis)
-                                    # use 'sol' token to indicate solution moves (EPD operand quoted)
-                                    output_line += f' ; sol "{moves_str}";'
-                                    self.log_callback(f"Added solution moves ({len(annotated_move_ucis)}) for line {processed}: {moves_str}")
-                                    # always append theme with mate distance so downstream tools can pick it up
-                                    try:
-                                        output_line += f' ; theme "mate {mate_moves}";'
-                                    except Exception:
-                                        pass
-
-                                fout.write(output_line + '\n')
-                                kept += 1
-                                self._kept = kept
-                                self.log_callback(f"Kept line {processed}: mate in {mate_moves}")
-                                debug_log(f"Kept line {processed}: mate in {mate_moves} (total kept = {kept})")
-                                try:
-                                    self.progress_callback(int(processed / total_positions * 100), processed, total_positions, kept)
-                                except Exception:
-                                    pass
-
-                    except Exception as e:
-                        self.log_callback(f"Engine error on line {processed}: {e}")
-                        # attempt to continue
-                        continue
-
-            # Close engine
-            try:
-                engine.quit()
-            except Exception:
-                pass
-
-            total_elapsed = time.time() - start_time
-            self.log_callback(f"Finished. Processed {processed}/{total_positions}, kept {kept}. Time: {timedelta(seconds=int(total_elapsed))}")
+            # Kept lines are appended to a bytearray; full chunks go to the writer
+            # thread, so the dispatcher never waits on the disk
+            write_buf = bytearray()
+            batches = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+            write_errors = []
+
+            def hand_off(flush=False):
+                nonlocal write_buf
+                if write_buf or flush:
+                    batches.put((write_buf, flush))
+                    write_buf = bytearray()
+
+            def collect_oldest():
+                nonlocal kept
+                line_number, line, board, future, _, key = pending.popleft()
+                try:
+                    info = future.result()
+                    mate_moves = write_result(write_buf, line, line_number, board, info)
+                    if seen.get(key) is future:
+                        # Only kept positions need their analysis for later duplicates
+                        seen[key] = info if mate_moves is not None else None
+                    if mate_moves is not None:
+                        kept += 1
+                        if len(write_buf) >= OUTPUT_CHUNK_SIZE:
+                            hand_off()
+                        debug_log(f"Kept line {line_number}: mate in {mate_moves} (total kept = {kept})")
+                except Exception as e:
+                    if seen.get(key) is future:
+                        # Let a later duplicate retry the search
+                        del seen[key]
+                    log_batch(f"Engine error on line {line_number}: {e}")
+
+            # FEN parsing runs on a producer thread, overlapping with the engines
+            parsed = queue.Queue(maxsize=PARSE_QUEUE_SIZE)
+            abort_reader = threading.Event()
+            reader = threading.Thread(target=self._read_positions, args=(parsed, abort_reader), daemon=True)
+
+            with open(self.output_path, 'wb', buffering=OUTPUT_BUFFER_SIZE) as fout:
+                writer = threading.Thread(target=self._write_batches, args=(fout, batches, write_errors), daemon=True)
+                writer.start()
+                try:
+                    reader.start()
+                    while True:
+                        if stop_is_set():
+                            flush_log_batch()
+                            log_cb('Analysis cancelled by user.')
+                            break
+
+                        item = parsed.get()
+                        if item is None:
+                            break
+                        if isinstance(item, BaseException):
+                            raise item
+                        processed, line, board, line_offset, offset, invalid = item
+
+                        if invalid:
+                            log_batch(f"Skipping invalid FEN at line {processed}")
+
+                        if board is not None:
+                            key = zobrist_hash(board)
+                            cached = seen.get(key, _UNSEEN)
+                            if cached is _UNSEEN:
+                                future = submit(analyse, board, limit)
+                                seen[key] = future
+                                if len(seen) > SEEN_CACHE_SIZE:
+                                    seen.popitem(last=False)
+                            else:
+                                seen.move_to_end(key)
+                                duplicates += 1
+                                if cached is None:
+                                    # Duplicate of a position that was not kept
+                                    future = None
+                                elif isinstance(cached, Future):
+                                    future = cached
+                                else:
+                                    future = Future()
+                                    future.set_result(cached)
+                            if future is not None:
+                                pending.append((processed, line, board, future, line_offset, key))
+                                while len(pending) >= window:
+                                    collect_oldest()
+
+                        report_progress()
+
+                    if stop_is_set():
+                        # Drop queued searches; searches already running still report
+                        for entry in pending:
+                            entry[3].cancel()
+                    while pending:
+                        if pending[0][3].cancelled():
+                            pending.popleft()
+                            processed -= 1
+                            continue
+                        collect_oldest()
+                finally:
+                    abort_reader.set()
+                    hand_off()
+                    batches.put(None)
+                    writer.join()
+                    flush_log_batch()
+            if write_errors:
+                raise write_errors[0]
+
+            if duplicates:
+                self.log_callback(f"Reused analysis for {duplicates} duplicate position(s).")
+            if self.prefiltered:
+                self.log_callback(f"Tactical prefilter skipped {self.prefiltered} position(s) without engine analysis.")
+            total_elapsed = time.monotonic() - start_time
+            if not self.stop_event.is_set():
+                total_positions = processed
+            self.log_callback(f"Finished. Processed {processed}/{total_positions or '?'}, kept {kept}. Time: {timedelta(seconds=int(total_elapsed))}")
             # Final progress update
-            try:
-                self.progress_callback(100, processed, total_positions, kept)
-            except Exception:
-                pass
-            try:
-                self.eta_callback(0)
-            except Exception:
-                pass
+            self.progress = (100, processed, total_positions or processed, kept)
+            self.eta = 0
+            if self.progress_callback is not None:
+                try:
+                    self.progress_callback(*self.progress)
+                except Exception:
+                    pass
+            if self.eta_callback is not None:
+                try:
+                    self.eta_callback(0)
+                except Exception:
+                    pass
 
         except Exception as e:
             try:
                 self.log_callback(f"Fatal error: {e}")
             except Exception:
                 pass
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+            # Close engines
+            for engine in self._engines:
+                try:
+                    engine.quit()
+                except Exception:
+                    pass
+            self._engines = []
 
 
-_SOL_PATTERN = re.compile(r';\s*sol\s*"([^"]+)"', re.IGNORECASE)
-_THEME_PATTERN = re.compile(r';\s*theme\s*"([^"]+)"', re.IGNORECASE)
+# The sol and theme operands, found in a single scan of the line
+_OPS_PATTERN = re.compile(r';\s*(?:sol\s*"(?P<sol>[^"]+)"|theme\s*"(?P<theme>[^"]+)")', re.IGNORECASE)
+# Bytes-level test for a sol operand; every line _OPS_PATTERN finds one in matches
+_SOL_BYTES_PATTERN = re.compile(rb';\s*sol\s*"', re.IGNORECASE)
+# Mate distance in a theme operand such as "mate 3"
 _MATE_PATTERN = re.compile(r'mate\s*([+-]?\d+)', re.IGNORECASE)
-_MOVE_SUFFIX_PATTERN = re.compile(r'[+#?!]+$', re.IGNORECASE)
+# Check, mate and annotation marks that may trail a solution move
+_MOVE_SUFFIX_CHARS = '+#?!'
 
 
 def _extract_solution_moves(solution_text):
-    tokens = []
     if not solution_text:
-        return tokens
-    for raw in solution_text.strip().split():
-        token = raw.strip()
-        if token:
-            tokens.append(token)
-    return tokens
+        return []
+    # split() already drops empty tokens and surrounding whitespace
+    return solution_text.split()
 
 
 def _extract_mate_moves(theme_text):
@@ -402,41 +1001,83 @@ def _extract_mate_moves(theme_text):
 def _sanitize_uci(move_text):
     if not move_text:
         return ''
-    return _MOVE_SUFFIX_PATTERN.sub('', move_text.strip())
+    return move_text.strip().rstrip(_MOVE_SUFFIX_CHARS)
+
 
+def _fen_with_turn(fen, color):
+    """Return fen with the side-to-move field set to color.
 
-def _build_puzzle_entry(board, solution_moves, mate_moves, fix_move_order, line_number=None, log_callback=None):
+    Flipping the side to move also clears the en passant square, matching
+    what board.fen() reports for such a position.
+    """
+    fields = fen.split(' ')
+    side = 'w' if color == chess.WHITE else 'b'
+    if fields[1] != side:
+        fields[1] = side
+        fields[3] = '-'
+    return ' '.join(fields)
+
+
+def _fen_after_move(board, move, color):
+    """Return the FEN after playing move with color to move; board is left unchanged."""
+    board.push(move)
+    try:
+        board.turn = color
+        return board.fen()
+    finally:
+        board.pop()
+
+
+def _build_puzzle_entry(board, solution_moves, mate_moves, fix_move_order, line_number=None, log_callback=None, fen=None):
     """
     Build one JSON puzzle entry.
     If fix_move_order=True, ensure the winning side is to move.
     If the first move belongs to the losing side, apply it to the board
     so the FEN reflects that move having been played.
+    fen is board.fen() when the caller already has it; when no move has to
+    be baked in, the output FEN is derived from it instead of re-serializing
+    the board.
+    Moves are played on board itself and taken back before returning.
     """
+    if fen is None:
+        fen = board.fen()
     try:
-        board_sim = board.copy()
         applied_moves = []
         valid_tokens = []
+        # Bound once for the per-move loop
+        from_uci = chess.Move.from_uci
+        is_legal = board.is_legal
+        push = board.push
+        winning_color = board.turn
         
-        # Parse and validate all moves, skipping invalid ones
-        for token in solution_moves:
-            mv_uci = _sanitize_uci(token)
-            if not mv_uci:
-                if log_callback:
-                    log_callback(f"Line {line_number or '?'}: skipping empty move '{token}'")
-                continue
-            try:
-                mv = chess.Move.from_uci(mv_uci)
-            except Exception as exc:
-                if log_callback:
-                    log_callback(f"Line {line_number or '?'}: skipping invalid move '{token}' ({exc})")
-                continue
-            if mv not in board_sim.legal_moves:
-                if log_callback:
-                    log_callback(f"Line {line_number or '?'}: skipping illegal move '{token}' (not in legal moves)")
-                continue
-            board_sim.push(mv)
-            applied_moves.append(mv_uci)
-            valid_tokens.append(token)  # Keep original token format with suffixes
+        # Parse and validate all moves, skipping invalid ones. They are played
+        # on board itself and taken back below instead of on a copy.
+        try:
+            for token in solution_moves:
+                mv_uci = _sanitize_uci(token)
+                if not mv_uci:
+                    if log_callback:
+                        log_callback(f"Line {line_number or '?'}: skipping empty move '{token}'")
+                    continue
+                try:
+                    mv = from_uci(mv_uci)
+                except Exception as exc:
+                    if log_callback:
+                        log_callback(f"Line {line_number or '?'}: skipping invalid move '{token}' ({exc})")
+                    continue
+                if not is_legal(mv):
+                    if log_callback:
+                        log_callback(f"Line {line_number or '?'}: skipping illegal move '{token}' (not in legal moves)")
+                    continue
+                push(mv)
+                applied_moves.append(mv_uci)
+                valid_tokens.append(token)  # Keep original token format with suffixes
+            # Determine winner (side that delivered mate)
+            if applied_moves and board.is_checkmate():
+                winning_color = not board.turn
+        finally:
+            for _ in applied_moves:
+                board.pop()
 
         if not applied_moves:
             if log_callback:
@@ -448,7 +1089,6 @@ def _build_puzzle_entry(board, solution_moves, mate_moves, fix_move_order, line_
             # Fallback: try to determine winning color from move count
             # If mate_moves is odd, the side that starts wins; if even, the other side wins
             # But simpler: assume the side that makes the last move (mate) is the winner
-            board_for_json = board.copy()
             moves_for_json = solution_moves.copy()
             
             # Determine winning color: if mate_moves is provided, count moves
@@ -465,23 +1105,26 @@ def _build_puzzle_entry(board, solution_moves, mate_moves, fix_move_order, line_
                 # Default: assume starting side wins (common case)
                 winning_color = board.turn
             
+            json_fen = fen
             if fix_move_order:
-                first_move_color = board_for_json.turn
+                # Set when the first move is baked into the FEN
+                baked_fen = None
+                first_move_color = board.turn
                 first_move_uci = _sanitize_uci(solution_moves[0]) if solution_moves else None
                 if first_move_uci:
                     try:
                         mv = chess.Move.from_uci(first_move_uci)
-                        if mv in board_for_json.legal_moves:
-                            board_for_json.push(mv)
+                        if mv in board.legal_moves:
+                            baked_fen = _fen_after_move(board, mv, winning_color)
                             moves_for_json = solution_moves[1:]
                             if log_callback:
                                 log_callback(f"Line {line_number or '?'}: fallback mode - baked first move {first_move_uci} into FEN.")
                     except Exception:
                         pass
-                board_for_json.turn = winning_color
+                json_fen = baked_fen or _fen_with_turn(fen, winning_color)
             
             return {
-                "fen": board_for_json.fen(),
+                "fen": json_fen,
                 "solution": moves_for_json,
                 "moves_to_mate": mate_moves,
                 "elo": 1200,
@@ -489,15 +1132,14 @@ def _build_puzzle_entry(board, solution_moves, mate_moves, fix_move_order, line_
                 "failed": 0
             }
 
-        # Determine winner (side that delivered mate)
-        winning_color = not board_sim.turn if board_sim.is_checkmate() else board.turn
-
-        board_for_json = board.copy()
-        moves_for_json = valid_tokens.copy()  # Use valid tokens preserving original format
+        moves_for_json = valid_tokens  # Use valid tokens preserving original format (local list, no copy needed)
+        json_fen = fen
 
         if fix_move_order:
+            # Set when the first move is baked into the FEN
+            baked_fen = None
             # Identify who moves first in original FEN
-            first_move_color = board_for_json.turn
+            first_move_color = board.turn
             
             # Get the first valid move that was actually applied
             if valid_tokens and applied_moves:
@@ -508,8 +1150,8 @@ def _build_puzzle_entry(board, solution_moves, mate_moves, fix_move_order, line_
                 if first_move_color != winning_color:
                     try:
                         mv = chess.Move.from_uci(first_move_uci)
-                        if mv in board_for_json.legal_moves:
-                            board_for_json.push(mv)
+                        if mv in board.legal_moves:
+                            baked_fen = _fen_after_move(board, mv, winning_color)
                             moves_for_json = valid_tokens[1:]  # Remove first move from solution
                             if log_callback:
                                 log_callback(f"Line {line_number or '?'}: baked first move {first_token} into FEN.")
@@ -518,10 +1160,10 @@ def _build_puzzle_entry(board, solution_moves, mate_moves, fix_move_order, line_
                             log_callback(f"Line {line_number or '?'}: failed to bake first move ({exc})")
 
             # Ensure correct side to move (winner)
-            board_for_json.turn = winning_color
+            json_fen = baked_fen or _fen_with_turn(fen, winning_color)
 
         return {
-            "fen": board_for_json.fen(),
+            "fen": json_fen,
             "solution": moves_for_json,
             "moves_to_mate": mate_moves,
             "elo": 1200,
@@ -536,67 +1178,112 @@ def _build_puzzle_entry(board, solution_moves, mate_moves, fix_move_order, line_
 
 
 def _parse_puzzle_from_line(raw_line, line_number, fix_move_order, log_callback=None):
-    sol_match = _SOL_PATTERN.search(raw_line)
-    if not sol_match:
+    sol_text = None
+    theme_text = None
+    for op in _OPS_PATTERN.finditer(raw_line):
+        # The first occurrence of each operand wins
+        if op.group('sol') is not None:
+            if sol_text is None:
+                sol_text = op.group('sol')
+        elif theme_text is None:
+            theme_text = op.group('theme')
+    if sol_text is None:
         if log_callback and line_number <= 3:  # Log first few lines for debugging
             log_callback(f"Line {line_number}: no 'sol' operand found. Line preview: {raw_line[:100]}")
         return None
 
-    solution_moves = _extract_solution_moves(sol_match.group(1))
+    solution_moves = _extract_solution_moves(sol_text)
     if not solution_moves:
         if log_callback:
             log_callback(f"Line {line_number}: 'sol' operand is empty.")
         return None
 
-    base_segment = raw_line.split(';', 1)[0].strip()
-    fields = base_segment.split()
-    if len(fields) < 4:
+    # Same anchored shape check as the analyser before paying for chess.Board,
+    # so abbreviated 4-field lines with operands are accepted here as well
+    fen_match = _FEN_PATTERN.match(raw_line)
+    if fen_match is None:
         if log_callback:
-            log_callback(f"Line {line_number}: not enough FEN fields to parse board.")
+            if len(raw_line.split(';', 1)[0].split(None, 4)) < 4:
+                log_callback(f"Line {line_number}: not enough FEN fields to parse board.")
+            else:
+                log_callback(f"Line {line_number}: invalid FEN (malformed fields).")
         return None
-    fen_fields = fields[:6] if len(fields) >= 6 else fields
-    fen = ' '.join(fen_fields)
-
     try:
-        board = chess.Board(fen)
+        board = chess.Board(fen_match.group(1))
     except Exception as exc:
         if log_callback:
             log_callback(f"Line {line_number}: invalid FEN ({exc}).")
         return None
+    # Always emit python-chess's normalized FEN (cleaned castling rights, en
+    # passant only when capturable, plain clocks), never the source text
+    fen = board.fen()
 
     mate_moves = None
-    theme_match = _THEME_PATTERN.search(raw_line)
-    if theme_match:
-        mate_moves = _extract_mate_moves(theme_match.group(1))
+    if theme_text is not None:
+        mate_moves = _extract_mate_moves(theme_text)
     if mate_moves is None:
         mate_moves = len(solution_moves)
 
-    entry = _build_puzzle_entry(board, solution_moves, mate_moves, fix_move_order, line_number=line_number, log_callback=log_callback)
+    entry = _build_puzzle_entry(board, solution_moves, mate_moves, fix_move_order, line_number=line_number, log_callback=log_callback, fen=fen)
     if not entry and log_callback and line_number <= 3:
         log_callback(f"Line {line_number}: _build_puzzle_entry returned None. Solution moves: {solution_moves[:5]}")
     return entry
 
 
-def generate_json_from_epd(source_path, fix_move_order=False, progress_callback=None, log_callback=None, stop_event=None):
-    total_lines = 0
+# Streamed JSON layout; byte-identical to json.dump(payload, indent=2)
+_JSON_HEADER = b'{\n  "theme": "Mates",\n  "pattern": "Mates",\n  "puzzles": ['
+
+
+# Entries are produced as UTF-8 bytes for the binary output stream
+if orjson is not None:
+    def _dumps_indented(entry):
+        # Same layout as json.dumps(indent=2), except non-ASCII is kept as UTF-8
+        return orjson.dumps(entry, option=orjson.OPT_INDENT_2)
+else:
+    def _dumps_indented(entry):
+        return json.dumps(entry, indent=2).encode('utf-8')
+
+
+def _format_puzzle(entry):
+    return b'\n    ' + _dumps_indented(entry).replace(b'\n', b'\n    ')
+
+
+def stream_json_from_epd(source_path, dest_path, fix_move_order=False, progress_callback=None, log_callback=None, stop_event=None):
+    """Write the puzzle JSON for source_path to dest_path one entry at a time.
+
+    Entries are written in batches of OUTPUT_BATCH, so memory use does not
+    grow with the number of kept puzzles. The document is written to a
+    temporary sibling file that replaces dest_path only on success, so a
+    cancelled or failed export leaves any previous file untouched. The source
+    is read in a single pass: progress is measured in bytes and the line total
+    is estimated until the end is reached. Returns (processed, kept, cancelled).
+    """
     try:
-        with open(source_path, 'r', encoding='utf-8', errors='ignore') as counter:
-            for _ in counter:
-                total_lines += 1
+        file_size = os.path.getsize(source_path)
     except FileNotFoundError:
         raise FileNotFoundError(f"Source EPD not found: {source_path}")
 
-    if total_lines == 0:
+    if file_size == 0:
         raise ValueError('Source EPD file is empty.')
 
-    puzzles = []
+    total_lines = 0
+    offset = 0
     processed = 0
     kept = 0
     cancelled = False
+    tmp_path = dest_path + '.part'
 
     try:
-        with open(source_path, 'r', encoding='utf-8', errors='ignore') as fin:
-            for line_number, raw_line in enumerate(fin, 1):
+        with open(source_path, 'rb', buffering=0) as fin, open(tmp_path, 'wb', buffering=OUTPUT_BUFFER_SIZE) as jf:
+            jf.write(_JSON_HEADER)
+            # Formatted entries are handed to the file buffer in bulk
+            entry_buf = []
+            has_sol = _SOL_BYTES_PATTERN.search
+            monotonic = time.monotonic
+            last_progress = 0.0
+            # Lines come from large blocks, as in the analyser; blank lines are
+            # dropped before they are decoded
+            for line_number, raw_line in enumerate(_iter_lines(fin), 1):
                 if stop_event and stop_event.is_set():
                     cancelled = True
                     if log_callback:
@@ -604,29 +1291,56 @@ def generate_json_from_epd(source_path, fix_move_order=False, progress_callback=
                     break
 
                 processed = line_number
+                offset += len(raw_line) + 1
                 stripped = raw_line.strip()
+                if stripped and line_number > 3 and not has_sol(stripped):
+                    # Cannot become a puzzle; only the first lines are decoded
+                    # for their diagnostics
+                    stripped = None
+                if stripped:
+                    stripped = stripped.decode('utf-8', 'ignore').strip()
                 if stripped:
                     entry = _parse_puzzle_from_line(stripped, line_number, fix_move_order, log_callback=log_callback)
                     if entry:
-                        puzzles.append(entry)
+                        if kept:
+                            entry_buf.append(b',')
+                        entry_buf.append(_format_puzzle(entry))
                         kept += 1
+                        if kept % OUTPUT_BATCH == 0:
+                            jf.writelines(entry_buf)
+                            entry_buf.clear()
                         if log_callback:
                             log_callback(f"Line {line_number}: added puzzle (mate in {entry['moves_to_mate']}).")
 
                 if progress_callback:
-                    pct = int(line_number / total_lines * 100)
-                    progress_callback(pct, line_number, total_lines, kept)
+                    # Throttled like the analyser; the final update below is unconditional
+                    now = monotonic()
+                    if now - last_progress >= UI_UPDATE_INTERVAL:
+                        last_progress = now
+                        done = min(offset, file_size)
+                        total_lines = max(line_number, line_number * file_size // done)
+                        progress_callback(done * 100 // file_size, line_number, total_lines, kept)
+            else:
+                total_lines = processed
+
+            jf.writelines(entry_buf)
+            jf.write(b'\n  ]\n}' if kept else b']\n}')
+
+        if cancelled:
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, dest_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
     finally:
         if progress_callback:
             progress_callback(100, processed, total_lines, kept)
 
-    payload = {
-        'theme': 'Mates',
-        'pattern': 'Mates',
-        'puzzles': puzzles
-    }
-
-    return payload, processed, kept, cancelled
+    return processed, kept, cancelled
 
 
 class JsonExportWorker(threading.Thread):
@@ -639,29 +1353,51 @@ class JsonExportWorker(threading.Thread):
         self.log_callback = log_callback
         self.finished_callback = finished_callback
         self.stop_event = stop_event
+        # Latest (percent, processed, total, kept), polled by the dialog
+        self.progress = (0, 0, 0, 0)
+        self._log_batch = None
+        self._last_log_flush = 0.0
+
+    def _record_progress(self, pct, processed, total, kept):
+        self.progress = (pct, processed, total, kept)
+        if self._log_batch is not None:
+            # Hand over queued log lines on a timer, as the analyser does,
+            # not only every LOG_BATCH_LINES lines
+            now = time.monotonic()
+            if now - self._last_log_flush >= LOG_FLUSH_INTERVAL:
+                self._last_log_flush = now
+                self._log_batch.flush()
+        if self.progress_callback:
+            self.progress_callback(pct, processed, total, kept)
 
     def run(self):
         try:
-            payload, processed, kept, cancelled = generate_json_from_epd(
-                self.source_path,
-                fix_move_order=self.fix_move_order,
-                progress_callback=self.progress_callback,
-                log_callback=self.log_callback,
-                stop_event=self.stop_event
-            )
+            dest_dir = os.path.dirname(self.dest_path)
+            if dest_dir and not os.path.exists(dest_dir):
+                os.makedirs(dest_dir, exist_ok=True)
+
+            # Per-puzzle messages go out in batches, as in the analyser
+            log_batch = _LogBatcher(self.log_callback) if self.log_callback else None
+            self._log_batch = log_batch
+            self._last_log_flush = time.monotonic()
+            try:
+                processed, kept, cancelled = stream_json_from_epd(
+                    self.source_path,
+                    self.dest_path,
+                    fix_move_order=self.fix_move_order,
+                    progress_callback=self._record_progress,
+                    log_callback=log_batch,
+                    stop_event=self.stop_event
+                )
+            finally:
+                if log_batch:
+                    log_batch.flush()
 
             if cancelled:
                 if self.finished_callback:
                     self.finished_callback(False, 'Export cancelled.', kept)
                 return
 
-            dest_dir = os.path.dirname(self.dest_path)
-            if dest_dir and not os.path.exists(dest_dir):
-                os.makedirs(dest_dir, exist_ok=True)
-
-            with open(self.dest_path, 'w', encoding='utf-8') as jf:
-                json.dump(payload, jf, indent=2)
-
             if self.log_callback:
                 self.log_callback(f"Saved JSON with {kept} puzzles to {self.dest_path} (processed {processed} lines).")
             if self.finished_callback:
@@ -682,6 +1418,13 @@ class JsonExportDialog(QDialog):
 
         self.worker = None
         self.stop_event = threading.Event()
+        self._app = QApplication.instance()
+        # Log lines from the export worker, applied once per event loop pass
+        self._updates = _PendingUpdates(self, self._apply_log)
+        # Shows the worker's progress while an export runs
+        self._progress_timer = QTimer(self)
+        self._progress_timer.setInterval(UI_POLL_INTERVAL_MS)
+        self._progress_timer.timeout.connect(self._show_progress)
 
         self._build_ui()
         self._load_settings(default_source, default_output)
@@ -721,8 +1464,9 @@ class JsonExportDialog(QDialog):
         layout.addWidget(self.progress_bar)
 
         layout.addWidget(QLabel('Log:'))
-        self.log = QTextEdit()
+        self.log = QPlainTextEdit()
         self.log.setReadOnly(True)
+        self.log.setMaximumBlockCount(LOG_MAX_BLOCKS)
         layout.addWidget(self.log)
 
         btn_layout = QHBoxLayout()
@@ -780,7 +1524,7 @@ class JsonExportDialog(QDialog):
             return
 
         source_path = self.source_line.text().strip()
-        if not source_path or not os.path.exists(source_path):
+        if not source_path or not os.path.isfile(source_path):
             QMessageBox.warning(self, 'Export JSON', 'Please select a valid source EPD file.')
             return
 
@@ -811,12 +1555,13 @@ class JsonExportDialog(QDialog):
             source_path=source_path,
             dest_path=dest_path,
             fix_move_order=fix_move_order,
-            progress_callback=self.on_progress,
+            progress_callback=None,
             log_callback=self.append_log,
             finished_callback=self.on_finished,
             stop_event=self.stop_event
         )
         self.worker.start()
+        self._progress_timer.start()
 
     def cancel_export(self):
         if self.worker and self.worker.is_alive():
@@ -824,36 +1569,41 @@ class JsonExportDialog(QDialog):
             self.status_label.setText('Status: Cancelling...')
             self.cancel_btn.setEnabled(False)
 
-    def on_progress(self, pct, processed, total, kept):
-        def upd():
-            self.progress_bar.setValue(pct)
-            self.status_label.setText(f'Status: {processed}/{total} lines, {kept} puzzles')
-        QApplication.instance().postEvent(self, _CallableEvent(upd))
+    def _show_progress(self):
+        if self.worker is None:
+            return
+        pct, processed, total, kept = self.worker.progress
+        self.progress_bar.setValue(pct)
+        self.status_label.setText(f'Status: {processed}/{total} lines, {kept} puzzles')
 
     def on_finished(self, success, message, kept):
-        def upd():
-            self.worker = None
-            self.cancel_btn.setEnabled(False)
-            self.export_btn.setEnabled(True)
-            if success:
-                self.status_label.setText(f'Status: Completed ({kept} puzzles).')
-                QMessageBox.information(self, 'Export JSON', f'JSON file saved to:\n{message}')
-                parent = self.parent()
-                if parent and hasattr(parent, 'append_log'):
-                    parent.append_log(f'JSON export saved to {message}')
-            else:
-                current = 'Cancelled' if self.stop_event.is_set() else 'Failed'
-                self.status_label.setText(f'Status: {current}.')
-                if message:
-                    QMessageBox.warning(self, 'Export JSON', message)
-            self.stop_event.clear()
-        QApplication.instance().postEvent(self, _CallableEvent(upd))
+        # Called from the worker thread
+        self._app.postEvent(self, _CallableEvent(self._apply_finished, success, message, kept))
+
+    def _apply_finished(self, success, message, kept):
+        self._progress_timer.stop()
+        self._show_progress()
+        self.worker = None
+        self.cancel_btn.setEnabled(False)
+        self.export_btn.setEnabled(True)
+        if success:
+            self.status_label.setText(f'Status: Completed ({kept} puzzles).')
+            QMessageBox.information(self, 'Export JSON', f'JSON file saved to:\n{message}')
+            parent = self.parent()
+            if parent and hasattr(parent, 'append_log'):
+                parent.append_log(f'JSON export saved to {message}')
+        else:
+            current = 'Cancelled' if self.stop_event.is_set() else 'Failed'
+            self.status_label.setText(f'Status: {current}.')
+            if message:
+                QMessageBox.warning(self, 'Export JSON', message)
+        self.stop_event.clear()
 
     def append_log(self, text):
-        def upd():
-            self.log.append(text)
-            self.log.verticalScrollBar().setValue(self.log.verticalScrollBar().maximum())
-        QApplication.instance().postEvent(self, _CallableEvent(upd))
+        self._updates.log(text)
+
+    def _apply_log(self, log_lines):
+        _append_log_lines(self.log, log_lines)
 
     def _save_settings(self, source, dest, fix_move_order):
         update_settings({
@@ -864,7 +1614,7 @@ class JsonExportDialog(QDialog):
 
     def event(self, e):
         if isinstance(e, _CallableEvent):
-            e.callable()
+            e.callable(*e.args)
             return True
         return super().event(e)
 
@@ -884,9 +1634,18 @@ class MainWindow(QMainWindow):
 
         self.engine_path = ''
         self.input_path = ''
+        # input_path without its extension, the stem of the suggested output names
+        self._input_base = ''
         self.output_path = ''
         self.analyzer = None
         self.stop_event = threading.Event()
+        # Log lines from the analyzer, applied once per event loop pass
+        self._updates = _PendingUpdates(self, self._apply_log)
+        # (path, line count) of the last counted input, reused by the analyzer
+        self._position_count = (None, 0)
+        # path -> [mtime_ns, size, line count], persisted so unchanged files are not rescanned
+        counts = _read_settings_data().get('position_counts')
+        self._count_cache = counts if isinstance(counts, dict) else {}
 
         self._build_ui()
         # load last used paths if available
@@ -958,6 +1717,24 @@ class MainWindow(QMainWindow):
         engine_opts.addWidget(self.depth_spin)
         engine_opts.addWidget(QLabel('Threads:'))
         engine_opts.addWidget(self.threads_spin)
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, MAX_WORKERS)
+        self.workers_spin.setValue(DEFAULT_WORKERS)
+        engine_opts.addWidget(QLabel('Workers:'))
+        engine_opts.addWidget(self.workers_spin)
+        self.hash_spin = QSpinBox()
+        self.hash_spin.setRange(MIN_HASH_MB, MAX_HASH_MB)
+        self.hash_spin.setValue(DEFAULT_HASH_MB)
+        self.hash_spin.setSuffix(' MB')
+        engine_opts.addWidget(QLabel('Hash:'))
+        engine_opts.addWidget(self.hash_spin)
+        self.time_cap_spin = QSpinBox()
+        self.time_cap_spin.setRange(0, MAX_TIME_CAP)
+        self.time_cap_spin.setValue(DEFAULT_TIME_CAP)
+        self.time_cap_spin.setSuffix(' s')
+        self.time_cap_spin.setSpecialValueText('Off')
+        engine_opts.addWidget(QLabel('Time cap:'))
+        engine_opts.addWidget(self.time_cap_spin)
         layout.addLayout(engine_opts)
 
         # === Mate Finder ===
@@ -965,13 +1742,21 @@ class MainWindow(QMainWindow):
 
         mate_layout = QHBoxLayout()
         self.mate_slider = QSlider(Qt.Horizontal)
-        self.mate_slider.setRange(0, 12)
+        self.mate_slider.setRange(0, MAX_MATE_LIMIT)
         self.mate_slider.setValue(6)
         self.mate_label = QLabel('Mate <= 6')
         self.mate_slider.valueChanged.connect(lambda v: self.mate_label.setText(f"Mate <= {v}"))
 
         mate_layout.addWidget(self.mate_label)
         mate_layout.addWidget(self.mate_slider)
+        self.prefilter_checkbox = QCheckBox('Tactical prefilter')
+        self.prefilter_checkbox.setToolTip(
+            f'Skip positions that are not in check, have more than {PREFILTER_MIN_MOVES} legal moves\n'
+            f'and no checking move, without asking the engine. Only used for mate limits up to '
+            f'{PREFILTER_MAX_MATE};\n'
+            f'such positions may still hide a mate that starts with a quiet move, or one against '
+            f'the side to move.\nThe number of skipped positions is logged at the end of the run.')
+        mate_layout.addWidget(self.prefilter_checkbox)
         layout.addLayout(mate_layout)
 
 
@@ -998,8 +1783,9 @@ class MainWindow(QMainWindow):
         layout.addLayout(ctrl_layout)
 
         # Log
-        self.log = QTextEdit()
+        self.log = QPlainTextEdit()
         self.log.setReadOnly(True)
+        self.log.setMaximumBlockCount(LOG_MAX_BLOCKS)
         layout.addWidget(QLabel('Log:'))
         layout.addWidget(self.log)
 
@@ -1016,16 +1802,16 @@ class MainWindow(QMainWindow):
             inp = data.get('last_input')
             eng = data.get('last_engine')
             out = data.get('last_output')
-            if inp and os.path.exists(inp):
+            if inp and os.path.isfile(inp):
                 self.input_path = inp
+                self._input_base = os.path.splitext(inp)[0]
                 self.input_line.setText(inp)
                 cnt = self.count_positions(inp)
                 self.count_label.setText(f'Positions: {cnt}')
                 # suggest output if none
                 if not out:
-                    base = os.path.splitext(inp)[0]
-                    out = base + '_mates.epd'
-            if eng and os.path.exists(eng):
+                    out = self._input_base + '_mates.epd'
+            if eng and os.path.isfile(eng):
                 self.engine_path = eng
                 self.engine_line.setText(eng)
             if out:
@@ -1047,14 +1833,14 @@ class MainWindow(QMainWindow):
         path, _ = QFileDialog.getOpenFileName(self, 'Open EPD', filter='EPD Files (*.epd);;All Files (*)')
         if path:
             self.input_path = path
+            self._input_base = os.path.splitext(path)[0]
             self.input_line.setText(path)
             # count lines quickly
             count = self.count_positions(path)
             self.count_label.setText(f'Positions: {count}')
 
             # suggest default output in same folder
-            base = os.path.splitext(path)[0]
-            suggested = base + '_mates.epd'
+            suggested = self._input_base + '_mates.epd'
             self.output_line.setText(suggested)
             self.output_path = suggested
             # save setting
@@ -1088,45 +1874,68 @@ class MainWindow(QMainWindow):
     @Slot()
     def open_json_export_dialog(self):
         default_source = ''
-        if self.output_path and os.path.exists(self.output_path):
+        default_output = ''
+        if self.output_path and os.path.isfile(self.output_path):
             default_source = self.output_path
-        elif self.input_path and os.path.exists(self.input_path):
+            default_output = os.path.splitext(default_source)[0] + '.json'
+        elif self.input_path and os.path.isfile(self.input_path):
             default_source = self.input_path
-
-        default_output = ''
-        if default_source:
-            base, _ = os.path.splitext(default_source)
-            default_output = base + '.json'
+            default_output = self._input_base + '.json'
 
         dialog = JsonExportDialog(self, default_source=default_source, default_output=default_output)
         dialog.exec()
     
+    def _stored_position_count(self, path):
+        """Return the stored line count of path if the file is unchanged, else None (never scans)."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        cached = self._count_cache.get(os.path.abspath(path))
+        if isinstance(cached, list) and len(cached) == 3 and cached[:2] == [st.st_mtime_ns, st.st_size]:
+            return cached[2]
+        return None
+
     def count_positions(self, path):
-        # fast count lines without loading file fully
+        # fast count lines without loading file fully; unchanged files reuse the stored count
         try:
-            cnt = 0
-            with open(path, 'rb') as f:
-                for chunk in iter(lambda: f.read(1024 * 1024), b''):
-                    cnt += chunk.count(b'\n')
-            return cnt
+            cnt = self._stored_position_count(path)
+            if cnt is None:
+                st = os.stat(path)
+                key = os.path.abspath(path)
+                cnt = count_lines(path)
+                # Re-insert so the dict stays ordered from least to most recently counted
+                self._count_cache.pop(key, None)
+                self._count_cache[key] = [st.st_mtime_ns, st.st_size, cnt]
+                while len(self._count_cache) > POSITION_COUNT_CACHE_SIZE:
+                    del self._count_cache[next(iter(self._count_cache))]
+                update_settings({'position_counts': self._count_cache})
         except Exception:
             return 0
+        self._position_count = (path, cnt)
+        return cnt
 
     @Slot()
     def start_analyze(self):
-        if not self.input_line.text() or not os.path.exists(self.input_line.text()):
+        # Read each field once; isfile() is a single stat and also rejects folders
+        inp = self.input_line.text()
+        eng = self.engine_line.text()
+        out = self.output_line.text()
+        if not inp or not os.path.isfile(inp):
             QMessageBox.warning(self, 'No input', 'Please select a valid input EPD file.')
             return
-        if not self.engine_line.text() or not os.path.exists(self.engine_line.text()):
+        if not eng or not os.path.isfile(eng):
             QMessageBox.warning(self, 'No engine', 'Please select a valid Stockfish (or UCI) engine executable.')
             return
-        if not self.output_line.text():
+        if not out:
             QMessageBox.warning(self, 'No output', 'Please choose an output file path.')
             return
 
-        self.input_path = self.input_line.text()
-        self.engine_path = self.engine_line.text()
-        self.output_path = self.output_line.text()
+        if inp != self.input_path:
+            self.input_path = inp
+            self._input_base = os.path.splitext(inp)[0]
+        self.engine_path = eng
+        self.output_path = out
 
         # disable UI controls
         self.analyze_btn.setEnabled(False)
@@ -1137,7 +1946,17 @@ class MainWindow(QMainWindow):
 
         depth = int(self.depth_spin.value())
         threads = int(self.threads_spin.value())
+        workers = int(self.workers_spin.value())
+        hash_mb = int(self.hash_spin.value())
+        time_cap = int(self.time_cap_spin.value())
         mate_limit = int(self.mate_slider.value())
+        counted_path, counted_total = self._position_count
+        if counted_path == self.input_path:
+            total_positions = counted_total
+        else:
+            # Typed-in path: use a stored count if there is one; the analyser
+            # estimates the total from the bytes read rather than scanning first
+            total_positions = self._stored_position_count(self.input_path)
 
         # start background thread
         self.analyzer = AnalyzerThread(
@@ -1146,10 +1965,16 @@ class MainWindow(QMainWindow):
             engine_path=self.engine_path,
             depth=depth,
             threads=threads,
+            workers=workers,
+            hash_mb=hash_mb,
+            time_cap=time_cap,
+            total_positions=total_positions,
             mate_limit=mate_limit,
             add_solution=self.add_solution_checkbox.isChecked(),
-            progress_callback=self.on_progress,
-            eta_callback=self.on_eta,
+            tactical_prefilter=self.prefilter_checkbox.isChecked(),
+            # Progress and ETA are polled from the thread by poll_thread()
+            progress_callback=None,
+            eta_callback=None,
             log_callback=self.append_log,
             stop_event=self.stop_event
         )
@@ -1159,9 +1984,9 @@ class MainWindow(QMainWindow):
         self.engine_status_label.setText(f"Engine: {os.path.basename(self.engine_path)}")
         debug_log(f"Analysis started with engine: {self.engine_path}")
 
-        # small timer to poll thread status and re-enable UI when done
+        # timer to show the thread's progress and re-enable UI when done
         self.poll_timer = QTimer()
-        self.poll_timer.setInterval(500)
+        self.poll_timer.setInterval(UI_POLL_INTERVAL_MS)
         self.poll_timer.timeout.connect(self.poll_thread)
         self.poll_timer.start()
 
@@ -1172,36 +1997,37 @@ class MainWindow(QMainWindow):
         self.cancel_btn.setEnabled(False)
 
     def poll_thread(self):
-        if self.analyzer and not self.analyzer.is_alive():
+        if not self.analyzer:
+            return
+        # Check liveness first so the last display after the thread ends is final
+        alive = self.analyzer.is_alive()
+        self._show_progress(self.analyzer)
+        if not alive:
             self.poll_timer.stop()
             self.analyzer = None
-    def on_progress(self, pct, processed, total, kept):
-        # Post a callable event to update progress UI from the analyzer thread
-        def upd():
-            self.load_progress.setValue(pct)
-            self.count_label.setText(f'Positions: {processed}/{total}')
-            self.kept_label.setText(f'Kept: {kept}')
-        QApplication.instance().postEvent(self, _CallableEvent(upd))
-
-    def on_eta(self, seconds_left):
-        def upd():
+
+    def _show_progress(self, analyzer):
+        pct, processed, total, kept = analyzer.progress
+        self.load_progress.setValue(pct)
+        self.count_label.setText(f'Positions: {processed}/{total}')
+        self.kept_label.setText(f'Kept: {kept}')
+        seconds_left = analyzer.eta
+        if seconds_left is not None:
             if seconds_left <= 0:
                 self.eta_label.setText('ETA: 0s')
             else:
                 self.eta_label.setText('ETA: ' + str(timedelta(seconds=int(seconds_left))))
-        QApplication.instance().postEvent(self, _CallableEvent(upd))
 
     def append_log(self, text):
-        def upd():
-            self.log.append(text)
-            # auto-scroll to bottom
-            self.log.verticalScrollBar().setValue(self.log.verticalScrollBar().maximum())
-        QApplication.instance().postEvent(self, _CallableEvent(upd))
+        self._updates.log(text)
+
+    def _apply_log(self, log_lines):
+        _append_log_lines(self.log, log_lines)
 
     # to receive posted callables
     def event(self, e):
         if isinstance(e, _CallableEvent):
-            e.callable()
+            e.callable(*e.args)
             return True
         return super().event(e)
 